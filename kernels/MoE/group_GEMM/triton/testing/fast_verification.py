@@ -1,6 +1,9 @@
+import contextlib
 import logging
+from unittest import mock
 
 import torch
+import torch.nn.functional as F
 
 # Configure logging
 logging.basicConfig(
@@ -16,13 +19,38 @@ from pytorch_reference_backwards import (
 )
 
 # Import the grouped GEMM modules
+import tgrouped_gemm_forward
 from tgrouped_gemm_backwards import grouped_gemm_backward
 from tgrouped_gemm_forward import grouped_gemm_forward as grouped_gemm
+from tgrouped_gemm_forward import grouped_gemm_fp8_rowwise
 
 
-def test_backward_pass():
+def _forward_paths():
+    """
+    Yield each forward kernel path: TMA when supported, and the pointer fallback.
+    """
+    yield "tma", contextlib.nullcontext()
+    yield "no_tma", mock.patch.object(
+        tgrouped_gemm_forward, "_use_tma", lambda device_index: False
+    )
+
+
+def _diagonal_blocks(y, m_sizes, N):
+    """
+    Gather each row's own group columns from a [M, N*G] grouped GEMM output.
+    Only these blocks are written by the kernels, the rest of y is left untouched.
+    """
+    M, G = y.shape[0], m_sizes.shape[0]
+    row_groups = torch.repeat_interleave(
+        torch.arange(G, device=y.device), m_sizes.long(), output_size=M
+    )
+    return y.view(M, G, N)[torch.arange(M, device=y.device), row_groups]
+
+
+def test_backward_pass(group_sizes=None):
     """
     A simple test for the grouped GEMM backward pass with detailed error handling.
+    group_sizes overrides the default near-equal split of the M rows.
     """
     try:
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -33,20 +61,24 @@ def test_backward_pass():
         N = 512  # Output dimension per group
         K = 256  # Hidden dimension
 
+        if group_sizes is None:
+            # Create group sizes, the first `remainder` groups get one extra row
+            base_size = M // G
+            remainder = M % G
+            m_sizes = torch.full((G,), base_size, device=device, dtype=torch.int32)
+            m_sizes[:remainder] += 1
+        else:
+            G = len(group_sizes)
+            M = sum(group_sizes)
+            m_sizes = torch.tensor(group_sizes, device=device, dtype=torch.int32)
+        m_starts = torch.cumsum(m_sizes, dim=0) - m_sizes
+
         # Create input and weight tensors
         x = torch.randn(M, K, dtype=torch.bfloat16, device=device, requires_grad=True)
         w = torch.randn(
             N * G, K, dtype=torch.bfloat16, device=device, requires_grad=True
         )
 
-        # Create group sizes
-        m_sizes = torch.zeros(G, device=device, dtype=torch.int32)
-        base_size = M // G
-        remainder = M % G
-
-        for i in range(G):
-            m_sizes[i] = base_size + (1 if i < remainder else 0)
-
         # Log the setup
         print(f"Test setup - G: {G}, M: {M}, N: {N}, K: {K}")
         print(f"Input x shape: {x.shape}")
@@ -80,20 +112,52 @@ def test_backward_pass():
         logging.info("Running PyTorch reference implementation")
 
         # Compute reference result
-        reference_result = torch.zeros_like(result)
-        m_start = 0
-        for g in range(G):
-            m_size = m_sizes[g].item()
-            m_end = m_start + m_size
-            n_start = g * N
-            n_end = (g + 1) * N
-
-            if m_size > 0:
-                reference_result[m_start:m_end, n_start:n_end] = (
-                    x_autograd[m_start:m_end, :] @ w_autograd[n_start:n_end, :].T
-                )
+        # Each row of x belongs to one group and only writes that group's N columns
+        m_sizes_list = m_sizes.tolist()
+        row_groups = torch.repeat_interleave(
+            torch.arange(G, device=device), m_sizes.long(), output_size=M
+        )
+        rows = torch.arange(M, device=device)
+        w_groups = w_autograd.view(G, N, K).transpose(1, 2)
+
+        if max(m_sizes_list) - min(m_sizes_list) <= 1:
+            # Near-equal groups: pad every group to the largest one and run a
+            # single batched matmul instead of one matmul per group
+            rows_in_group = rows - m_starts[row_groups]
+            x_groups = x_autograd.new_zeros((G, max(m_sizes_list), K)).index_put(
+                (row_groups, rows_in_group), x_autograd
+            )
+            rows_result = torch.bmm(x_groups, w_groups)[row_groups, rows_in_group]
+        else:
+            # Unequal groups: grouped matmul over the cumulative row offsets
+            rows_result = torch._grouped_mm(
+                x_autograd,
+                w_groups,
+                offs=torch.cumsum(m_sizes, dim=0, dtype=torch.int32),
+            )
+
+        # Scatter the per-row results into their group's column block
+        reference_result = (
+            x_autograd.new_zeros((M, G, N))
+            .index_put((rows, row_groups), rows_result)
+            .view(M, G * N)
+        )
+
+        # Check if results are close using allclose
+        rtol = 1e-2  # Relative tolerance for bfloat16
+        atol = 1e-2  # Absolute tolerance for bfloat16
 
-            m_start = m_end
+        # Compare the forward result on the blocks the kernel writes
+        forward_close = torch.allclose(
+            _diagonal_blocks(result, m_sizes, N).float(),
+            rows_result.detach().float(),
+            rtol=rtol,
+            atol=atol,
+        )
+        if not forward_close:
+            logging.warning("FAILED: Forward result mismatch detected")
+        else:
+            logging.info("✓ SUCCESS! Forward result matches the PyTorch reference")
 
         # Backpropagate using PyTorch
         reference_result.backward(grad_output)
@@ -107,10 +171,6 @@ def test_backward_pass():
             f"Maximum gradient error - grad_x: {grad_x_error}, grad_w: {grad_w_error}"
         )
 
-        # Check if gradients are close using allclose
-        rtol = 1e-2  # Relative tolerance for bfloat16
-        atol = 1e-2  # Absolute tolerance for bfloat16
-
         grad_x_close = torch.allclose(grad_x, x_autograd.grad, rtol=rtol, atol=atol)
         if not grad_x_close:
             logging.warning("FAILED: Gradient mismatch detected in grad_x")
@@ -179,7 +239,119 @@ def test_backward_pass():
                 f"Zeros in w_autograd.grad: {zeros_autograd_w}/{w_autograd.grad.numel()} ({zeros_autograd_w/w_autograd.grad.numel()*100:.2f}%)"
             )
 
-        return grad_x_close and grad_w_close
+        return forward_close and grad_x_close and grad_w_close
+
+    except Exception as e:
+        logging.error(f"Test failed with error: {e}")
+        import traceback
+
+        logging.error(traceback.format_exc())
+        return False
+
+
+def test_forward_out():
+    """
+    Check that the forward writes into a caller provided out tensor.
+    """
+    try:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        G, M, N, K = 4, 256, 256, 256
+        x = torch.randn(M, K, dtype=torch.bfloat16, device=device)
+        w = torch.randn(N * G, K, dtype=torch.bfloat16, device=device)
+        m_sizes = torch.tensor([96, 0, 100, 60], device=device, dtype=torch.int32)
+
+        success = True
+        for path, ctx in _forward_paths():
+            with ctx:
+                expected = grouped_gemm(x, w, m_sizes)
+                out = torch.zeros(M, N * G, dtype=torch.bfloat16, device=device)
+                result = grouped_gemm(x, w, m_sizes, out=out)
+
+            # Same kernel and inputs, so the written blocks must match exactly
+            close = result is out and torch.equal(
+                _diagonal_blocks(out, m_sizes, N),
+                _diagonal_blocks(expected, m_sizes, N),
+            )
+            if not close:
+                logging.error(f"✗ FAILURE: out= mismatch on the {path} path")
+            else:
+                logging.info(f"✓ SUCCESS: out= matches on the {path} path")
+            success = success and close
+
+        return success
+
+    except Exception as e:
+        logging.error(f"Test failed with error: {e}")
+        import traceback
+
+        logging.error(traceback.format_exc())
+        return False
+
+
+def test_fp8_rowwise_activation():
+    """
+    Check the fp8 rowwise forward and its fused activations against fp32.
+    """
+    try:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        G, M, N, K = 4, 256, 256, 512
+        fp8_dtype = torch.float8_e4m3fnuz if torch.version.hip else torch.float8_e4m3fn
+        fp8_max = torch.finfo(fp8_dtype).max
+
+        def quantize_rowwise(t):
+            scale = t.abs().amax(dim=1).clamp(min=1e-12) / fp8_max
+            return (t / scale[:, None]).to(fp8_dtype), scale
+
+        x_fp8, x_scale = quantize_rowwise(torch.randn(M, K, device=device))
+        w_fp8, w_scale = quantize_rowwise(torch.randn(N * G, K, device=device))
+        m_sizes = torch.tensor([64, 100, 0, 92], device=device, dtype=torch.int32)
+
+        # Reference in fp32 from the dequantized operands, one matmul per group
+        x_ref = x_fp8.float() * x_scale[:, None]
+        w_ref = w_fp8.float() * w_scale[:, None]
+        reference = torch.cat(
+            [
+                x_g @ w_ref[g * N : (g + 1) * N].t()
+                for g, x_g in enumerate(x_ref.split(m_sizes.tolist()))
+            ]
+        )
+
+        rtol = 1e-2  # Relative tolerance for bfloat16 output
+        atol = 1e-2  # Absolute tolerance for bfloat16 output
+
+        success = True
+        for path, ctx in _forward_paths():
+            for activation, act_fn in [
+                (None, lambda t: t),
+                ("gelu", F.gelu),
+                ("silu", F.silu),
+            ]:
+                with ctx:
+                    result = grouped_gemm_fp8_rowwise(
+                        x_fp8, w_fp8, m_sizes, x_scale, w_scale, activation
+                    )
+
+                close = torch.allclose(
+                    _diagonal_blocks(result, m_sizes, N).float(),
+                    act_fn(reference),
+                    rtol=rtol,
+                    atol=atol,
+                )
+                if not close:
+                    logging.error(
+                        f"✗ FAILURE: fp8 rowwise mismatch, "
+                        f"activation={activation} on the {path} path"
+                    )
+                else:
+                    logging.info(
+                        f"✓ SUCCESS: fp8 rowwise matches, "
+                        f"activation={activation} on the {path} path"
+                    )
+                success = success and close
+
+        return success
 
     except Exception as e:
         logging.error(f"Test failed with error: {e}")
@@ -197,3 +369,14 @@ if __name__ == "__main__":
 
     success = test_backward_pass()
     logging.info(f"Test {'succeeded' if success else 'failed'}")
+
+    # Skewed group sizes with an empty group, exercises the torch._grouped_mm
+    # reference (offsets kept multiples of 16 as it requires)
+    print("Running test_backward_pass with skewed groups")
+    success = test_backward_pass(group_sizes=[512, 0, 64, 320, 16, 112])
+    logging.info(f"Test {'succeeded' if success else 'failed'}")
+
+    for test in [test_forward_out, test_fp8_rowwise_activation]:
+        print(f"Running {test.__name__}")
+        success = test()
+        logging.info(f"Test {'succeeded' if success else 'failed'}")
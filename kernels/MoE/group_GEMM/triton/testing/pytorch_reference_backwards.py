@@ -31,8 +31,7 @@ def _compute_grad_x_pytorch(grad_output, w, m_sizes, grad_x):
 
     # Process each group separately
     m_start = 0
-    for g in range(G):
-        m_size = m_sizes[g].item()
+    for g, m_size in enumerate(m_sizes.tolist()):
         if m_size > 0:
             m_end = m_start + m_size
             n_start = g * N
@@ -88,8 +87,7 @@ def _compute_grad_w_pytorch(grad_output, x, m_sizes, grad_w):
 
     # Process each group separately
     m_start = 0
-    for g in range(G):
-        m_size = m_sizes[g].item()
+    for g, m_size in enumerate(m_sizes.tolist()):
         if m_size > 0:
             m_end = m_start + m_size
             n_start = g * N
@@ -177,8 +175,7 @@ def _pytorch_reference_backward(grad_output, x, w, m_sizes):
     N = w.shape[0] // G
 
     m_start = 0
-    for g in range(G):
-        m_size = m_sizes[g].item()
+    for g, m_size in enumerate(m_sizes.tolist()):
         if m_size > 0:
             m_end = m_start + m_size
             n_start = g * N
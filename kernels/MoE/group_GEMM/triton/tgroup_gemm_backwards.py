@@ -469,12 +469,9 @@ def grouped_gemm_backward(
         stride_gw_k = grad_w.stride(1)  # grad_w in K dimension
 
         # Pre-compute group offsets for indexing
+        # Exclusive prefix sum computed on device, no per-group host sync
         group_offsets = torch.zeros(G + 1, device=m_sizes.device, dtype=torch.int32)
-        m_offset = 0
-        for g in range(G):
-            group_offsets[g] = m_offset
-            m_offset += m_sizes[g].item()
-        group_offsets[G] = m_offset  # Total M
+        group_offsets[1:] = torch.cumsum(m_sizes, dim=0)  # last entry is total M
 
         # Check if K dimension is even (optimize memory access patterns)
         EVEN_K = (K_x % 8) == 0
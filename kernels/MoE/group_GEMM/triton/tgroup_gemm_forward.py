@@ -10,7 +10,8 @@
 # https://github.com/pytorch/FBGEMM/blob/main/fbgemm_gpu/experimental/gemm/triton_gemm/grouped_gemm.py
 
 import functools
-from typing import Optional
+import os
+from typing import Dict, Optional, Tuple
 
 import tma_utils as utils
 
@@ -20,32 +21,53 @@ import triton
 import triton.language as tl
 from triton.runtime import driver  # @manual
 
-"""
-_NV_CONFIGS = [
-    triton.Config(
-        {
-            "BLOCK_SIZE_M": block_size_m,
-            "BLOCK_SIZE_N": block_size_n,
-            "BLOCK_SIZE_K": block_size_k,
-        },
-        num_stages=num_stages,
-        num_warps=num_warps,
-        num_ctas=num_ctas,
-    )
-    for block_size_m in [64, 128]
-    for block_size_n in [64, 128, 256]
-    for block_size_k in [64, 128, 256]
-    for num_stages in [3, 4]
-    for num_warps in [4, 8]
-    for num_ctas in [1]
+# (BLOCK_SIZE_M, BLOCK_SIZE_N, num_warps, num_stages)
+_NV_TILE_SHAPES = [
+    # large square / wide tiles for compute bound shapes on H100
+    (128, 128, 8, 4),
+    (128, 256, 8, 3),
+    (64, 256, 8, 4),
+    (256, 64, 8, 4),
+    # thinner tiles for small groups or narrow N
+    (64, 128, 4, 4),
+    (128, 64, 4, 4),
+    # small M tiles for decode, where most groups only see a few tokens
+    (16, 128, 4, 5),
+    (16, 256, 4, 5),
+    (32, 128, 4, 5),
+    (32, 256, 4, 5),
 ]
 
+
+def _nv_configs(block_size_k):
+    # BLOCK_SIZE_K is picked per input dtype so that every TMA box row of A and W
+    # is 128 bytes, which lets both tiles use the 128B shared memory swizzle
+    return [
+        triton.Config(
+            {
+                "BLOCK_SIZE_M": block_size_m,
+                "BLOCK_SIZE_N": block_size_n,
+                "BLOCK_SIZE_K": block_size_k,
+                "NUM_STAGES": num_stages,
+            },
+            num_stages=num_stages,
+            num_warps=num_warps,
+            num_ctas=1,
+        )
+        for block_size_m, block_size_n, num_warps, num_stages in _NV_TILE_SHAPES
+    ]
+
+
+_NV_CONFIGS = _nv_configs(block_size_k=64)  # bf16
+_NV_FP8_CONFIGS = _nv_configs(block_size_k=128)  # fp8
+
 _AMD_CONFIGS = [
     triton.Config(
         {
             "BLOCK_SIZE_M": block_size_m,
             "BLOCK_SIZE_N": block_size_n,
             "BLOCK_SIZE_K": block_size_k,
+            "NUM_STAGES": num_stages,
             "waves_per_eu": waves_per_cu,
             "matrix_instr_nonkdim": matrix_instr_nonkdim,
         },
@@ -61,13 +83,15 @@ _AMD_CONFIGS = [
 ]
 
 
-def early_config_prune(configs, named_args, dtsize=None, dtype=None, **kwargs):
+def early_config_prune(
+    configs, named_args, dtsize=None, dtype=None, dtype_arg="c_ptr", **kwargs
+):
     device = torch.cuda.current_device()
     # BLOCK_M, BLOCK_N, BLOCK_K, SPLIT_K, num_warps, num_stages
     if dtsize is None:
-        dtsize = named_args["c_ptr"].element_size()
+        dtsize = named_args[dtype_arg].element_size()
     if dtype is None:
-        dtype = named_args["c_ptr"].dtype
+        dtype = named_args[dtype_arg].dtype
 
     pruned_configs = []
     for config in configs:
@@ -122,45 +146,61 @@ def early_config_prune(configs, named_args, dtsize=None, dtype=None, **kwargs):
 
         pruned_configs.append(config)
 
+    # never leave the autotuner with nothing to benchmark
+    if not pruned_configs:
+        return configs
+
     return pruned_configs
 
 
+def _small_m(args):
+    # Groups average at most 32 rows, so they span very few M tiles
+    return args["M_BUCKET"] <= 32 * args["G"]
+
+
 @triton.autotune(
     configs=_AMD_CONFIGS if torch.version.hip else _NV_CONFIGS,
     key=["G", "M_BUCKET", "N", "K"],
     prune_configs_by={"early_config_prune": early_config_prune},
 )
-"""
-
-
+@triton.heuristics({"SMALL_M": _small_m})
 @triton.jit
 def _kernel_grouped_gemm(
-    a_desc_ptr,
-    b_desc_ptr,
+    a_ptr,
+    b_ptr,
     c_ptr,
-    workspace,
     m_sizes,
     # problem sizes
+    M_TOTAL,
     G: tl.constexpr,
     M_BUCKET: tl.constexpr,
     N: tl.constexpr,  # N is per group
     K: tl.constexpr,
     NUM_SMS: tl.constexpr,
-    USE_TMA_LOAD: tl.constexpr,
-    USE_TMA_STORE: tl.constexpr,
     # tile sizes
     BLOCK_SIZE_M: tl.constexpr,
     BLOCK_SIZE_N: tl.constexpr,
     BLOCK_SIZE_K: tl.constexpr,
+    NUM_STAGES: tl.constexpr,
+    SMALL_M: tl.constexpr,
+    GROUP_SIZE_M: tl.constexpr = 8,
 ) -> None:
     tidx = tl.program_id(0)
 
-    dtype: tl.dtype = c_ptr.dtype.element_ty
-    TMA_SIZE: tl.constexpr = tl.constexpr(128)
-    if USE_TMA_STORE:
-        c_desc_ptr = workspace + tidx * TMA_SIZE
-    else:
-        c_desc_ptr = None
+    # Input and weight descriptors cover the full tensors and are built once,
+    # tiles are addressed with global row offsets
+    a_desc = tl.make_tensor_descriptor(
+        a_ptr,
+        shape=[M_TOTAL, K],
+        strides=[K, 1],
+        block_shape=[BLOCK_SIZE_M, BLOCK_SIZE_K],
+    )
+    b_desc = tl.make_tensor_descriptor(
+        b_ptr,
+        shape=[N * G, K],
+        strides=[K, 1],
+        block_shape=[BLOCK_SIZE_N, BLOCK_SIZE_K],
+    )
 
     M_end_offset = 0
     iterated_tiles = 0
@@ -179,116 +219,68 @@ def _kernel_grouped_gemm(
             num_m_tiles = tl.cdiv(m_size, BLOCK_SIZE_M)
             num_n_tiles = tl.cdiv(n_size, BLOCK_SIZE_N)
             num_tiles = num_m_tiles * num_n_tiles
-
-            if USE_TMA_STORE:
-                # Set up TMA descriptor for output
-                # pyre-ignore
-                tl.extra.cuda.experimental_device_tensormap_create2d(
-                    desc_ptr=c_desc_ptr,
-                    global_address=c_ptr
-                    + M_start_offset * (N * G)
-                    + N_start_offset,  # Offset to this group's output
-                    load_size=[BLOCK_SIZE_M, BLOCK_SIZE_N],
-                    global_size=[m_size, n_size],
-                    element_ty=c_ptr.dtype.element_ty,
+            num_tiles_in_super_group = GROUP_SIZE_M * num_n_tiles
+
+            # Only programs that own a tile in this group build its descriptor
+            if tidx >= iterated_tiles and tidx < iterated_tiles + num_tiles:
+                # Set up TMA descriptor for this group's output, bounded to the
+                # group so the last M tile cannot spill into the next group's rows
+                c_desc = tl.make_tensor_descriptor(
+                    c_ptr + M_start_offset * (N * G) + N_start_offset,
+                    shape=[m_size, n_size],
+                    strides=[N * G, 1],  # Row stride is N*G
+                    block_shape=[BLOCK_SIZE_M, BLOCK_SIZE_N],
                 )
-                # pyre-ignore
-                tl.extra.cuda.experimental_tensormap_fenceproxy_acquire(c_desc_ptr)
 
-            # Move across tiles
-            while tidx >= iterated_tiles and tidx < iterated_tiles + num_tiles:
-                gidx = tidx - iterated_tiles
-                # Split M first and N second.
-                tile_m_idx = gidx % num_m_tiles
-                tile_n_idx = gidx // num_m_tiles
+                # Move across tiles
+                while tidx >= iterated_tiles and tidx < iterated_tiles + num_tiles:
+                    gidx = tidx - iterated_tiles
+                    if SMALL_M:
+                        # Too few M tiles for swizzling to matter, plain row-major
+                        tile_m_idx = gidx // num_n_tiles
+                        tile_n_idx = gidx % num_n_tiles
+                    else:
+                        # Walk tiles in super-groups of GROUP_SIZE_M tile rows so
+                        # programs running together share A rows and B columns in L2
+                        super_group_id = gidx // num_tiles_in_super_group
+                        first_tile_m_idx = super_group_id * GROUP_SIZE_M
+                        super_group_size_m = tl.minimum(
+                            num_m_tiles - first_tile_m_idx, GROUP_SIZE_M
+                        )
+                        gidx_in_super_group = gidx % num_tiles_in_super_group
+                        tile_m_idx = first_tile_m_idx + (
+                            gidx_in_super_group % super_group_size_m
+                        )
+                        tile_n_idx = gidx_in_super_group // super_group_size_m
 
-                accumulator = tl.zeros((BLOCK_SIZE_M, BLOCK_SIZE_N), dtype=tl.float32)
-                tl.static_assert(K % BLOCK_SIZE_K == 0)
+                    accumulator = tl.zeros(
+                        (BLOCK_SIZE_M, BLOCK_SIZE_N), dtype=tl.float32
+                    )
 
-                if USE_TMA_LOAD:
                     # Use TMA to load input and weight blocks
                     m_offset = (M_start_offset + tile_m_idx * BLOCK_SIZE_M).to(tl.int32)
                     n_offset = (N_start_offset + tile_n_idx * BLOCK_SIZE_N).to(tl.int32)
 
-                    for k_offset in range(0, K, BLOCK_SIZE_K):
+                    for k_offset in tl.range(0, K, BLOCK_SIZE_K, num_stages=NUM_STAGES):
                         # Load input block [M, K]
-                        a = tl._experimental_descriptor_load(
-                            a_desc_ptr,
-                            [m_offset, k_offset],
-                            [BLOCK_SIZE_M, BLOCK_SIZE_K],
-                            dtype,
-                        )
+                        a = a_desc.load([m_offset, k_offset])
 
                         # Load weight block [N, K]
-                        b = tl._experimental_descriptor_load(
-                            b_desc_ptr,
-                            [n_offset, k_offset],
-                            [BLOCK_SIZE_N, BLOCK_SIZE_K],
-                            dtype,
-                        )
+                        b = b_desc.load([n_offset, k_offset])
 
-                        # Compute matrix multiplication
-                        accumulator += tl.dot(a, b.T)
-                else:
-                    # Manual load without TMA
-                    offs_am = tile_m_idx * BLOCK_SIZE_M + tl.arange(0, BLOCK_SIZE_M)
-                    offs_bn = tile_n_idx * BLOCK_SIZE_N + tl.arange(0, BLOCK_SIZE_N)
-                    offs_k = tl.arange(0, BLOCK_SIZE_K)
+                        # Compute matrix multiplication, the transpose of the
+                        # K-major smem tile is folded into the MMA operand layout
+                        accumulator = tl.dot(a, b.T, accumulator, out_dtype=tl.float32)
 
-                    a_ptrs = (
-                        a_desc_ptr
-                        + (M_start_offset + offs_am[:, None]) * K
-                        + offs_k[None, :]
-                    )
-
-                    b_ptrs = (
-                        b_desc_ptr
-                        + (N_start_offset + offs_bn[:, None]) * K
-                        + offs_k[None, :]
-                    )
-
-                    for k_offset in range(0, K, BLOCK_SIZE_K):
-                        # Load with bounds checking
-                        a = tl.load(a_ptrs, mask=offs_am[:, None] < m_size)
-                        b = tl.load(b_ptrs, mask=offs_bn[:, None] < n_size)
-
-                        # Compute matrix multiplication
-                        accumulator += tl.dot(a, b.T)
-
-                        # Update pointers for next block
-                        a_ptrs += BLOCK_SIZE_K
-                        b_ptrs += BLOCK_SIZE_K
-
-                # Store result
-                if USE_TMA_STORE:
-                    # Store using TMA
+                    # Store result using TMA
                     m_offset = (tile_m_idx * BLOCK_SIZE_M).to(tl.int32)
                     n_offset = (tile_n_idx * BLOCK_SIZE_N).to(tl.int32)
 
-                    tl._experimental_descriptor_store(
-                        c_desc_ptr,
-                        accumulator.to(c_ptr.dtype.element_ty),
-                        [m_offset, n_offset],
-                    )
-                else:
-                    # Manual store
-                    offs_am = tile_m_idx * BLOCK_SIZE_M + tl.arange(0, BLOCK_SIZE_M)
-                    offs_bn = tile_n_idx * BLOCK_SIZE_N + tl.arange(0, BLOCK_SIZE_N)
-
-                    c = accumulator.to(c_ptr.dtype.element_ty)
+                    # Accumulate in fp32 over K, downcast once right before the store
+                    c_bf16 = accumulator.to(tl.bfloat16)
+                    c_desc.store([m_offset, n_offset], c_bf16)
 
-                    tl.store(
-                        c_ptr
-                        + (M_start_offset + offs_am[:, None])
-                        * (N * G)  # Row stride is N*G
-                        + (
-                            N_start_offset + offs_bn[None, :]
-                        ),  # Column offset to this group's N
-                        c,
-                        mask=offs_am[:, None] < m_size and offs_bn[None, :] < n_size,
-                    )
-
-                tidx += NUM_SMS  # Move to next tile
+                    tidx += NUM_SMS  # Move to next tile
 
             iterated_tiles += num_tiles
 
@@ -296,8 +288,8 @@ def _kernel_grouped_gemm(
 TT_FP8_DTYPE = tl.float8e4b8 if torch.version.hip else tl.float8e4nv
 
 
-"""@triton.autotune(
-    configs=_AMD_CONFIGS if torch.version.hip else _NV_CONFIGS,
+@triton.autotune(
+    configs=_AMD_CONFIGS if torch.version.hip else _NV_FP8_CONFIGS,
     key=["G", "M_BUCKET", "N", "K"],
     prune_configs_by={
         "early_config_prune": functools.partial(
@@ -305,39 +297,52 @@ TT_FP8_DTYPE = tl.float8e4b8 if torch.version.hip else tl.float8e4nv
         )
     },
 )
-"""
-
-
+@triton.heuristics({"SMALL_M": _small_m})
 @triton.jit
 def _kernel_grouped_gemm_fp8_rowwise(
-    a_desc_ptr,
+    a_ptr,
     a_scale_ptr,
-    b_desc_ptr,
+    b_ptr,
     b_scale_ptr,
     c_ptr,
-    workspace,
     m_sizes,
     # problem sizes
+    M_TOTAL,
     G: tl.constexpr,
     M_BUCKET: tl.constexpr,
     N: tl.constexpr,  # N is per group
     K: tl.constexpr,
     NUM_SMS: tl.constexpr,
-    USE_TMA_LOAD: tl.constexpr,
-    USE_TMA_STORE: tl.constexpr,
     # tile sizes
     BLOCK_SIZE_M: tl.constexpr,
     BLOCK_SIZE_N: tl.constexpr,
     BLOCK_SIZE_K: tl.constexpr,
+    NUM_STAGES: tl.constexpr,
+    SMALL_M: tl.constexpr,
+    GROUP_SIZE_M: tl.constexpr = 8,
+    ACT: tl.constexpr = 0,  # 0: none, 1: gelu, 2: silu
 ) -> None:
     tidx = tl.program_id(0)
 
-    dtype = TT_FP8_DTYPE
-    TMA_SIZE: tl.constexpr = tl.constexpr(128)
-    if USE_TMA_STORE:
-        c_desc_ptr = workspace + tidx * TMA_SIZE
-    else:
-        c_desc_ptr = None
+    # Both operands must reach tl.dot as FP8 to run on the FP8 tensor cores,
+    # any wider input would silently fall back to the 16-bit MMA path
+    tl.static_assert(a_ptr.dtype.element_ty.is_fp8())
+    tl.static_assert(b_ptr.dtype.element_ty.is_fp8())
+
+    # Input and weight descriptors cover the full tensors and are built once,
+    # tiles are addressed with global row offsets
+    a_desc = tl.make_tensor_descriptor(
+        a_ptr,
+        shape=[M_TOTAL, K],
+        strides=[K, 1],
+        block_shape=[BLOCK_SIZE_M, BLOCK_SIZE_K],
+    )
+    b_desc = tl.make_tensor_descriptor(
+        b_ptr,
+        shape=[N * G, K],
+        strides=[K, 1],
+        block_shape=[BLOCK_SIZE_N, BLOCK_SIZE_K],
+    )
 
     M_end_offset = 0
     iterated_tiles = 0
@@ -356,125 +361,274 @@ def _kernel_grouped_gemm_fp8_rowwise(
             num_m_tiles = tl.cdiv(m_size, BLOCK_SIZE_M)
             num_n_tiles = tl.cdiv(n_size, BLOCK_SIZE_N)
             num_tiles = num_m_tiles * num_n_tiles
-
-            if USE_TMA_STORE:
-                # Set up TMA descriptor for output
-                # pyre-ignore
-                tl.extra.cuda.experimental_device_tensormap_create2d(
-                    desc_ptr=c_desc_ptr,
-                    global_address=c_ptr
-                    + M_start_offset * (N * G)
-                    + N_start_offset,  # Offset to this group's output
-                    load_size=[BLOCK_SIZE_M, BLOCK_SIZE_N],
-                    global_size=[m_size, n_size],
-                    element_ty=c_ptr.dtype.element_ty,
+            num_tiles_in_super_group = GROUP_SIZE_M * num_n_tiles
+
+            # Only programs that own a tile in this group build its descriptor
+            if tidx >= iterated_tiles and tidx < iterated_tiles + num_tiles:
+                # Set up TMA descriptor for this group's output, bounded to the
+                # group so the last M tile cannot spill into the next group's rows
+                c_desc = tl.make_tensor_descriptor(
+                    c_ptr + M_start_offset * (N * G) + N_start_offset,
+                    shape=[m_size, n_size],
+                    strides=[N * G, 1],  # Row stride is N*G
+                    block_shape=[BLOCK_SIZE_M, BLOCK_SIZE_N],
                 )
-                # pyre-ignore
-                tl.extra.cuda.experimental_tensormap_fenceproxy_acquire(c_desc_ptr)
 
-            # Move across tiles
-            while tidx >= iterated_tiles and tidx < iterated_tiles + num_tiles:
-                gidx = tidx - iterated_tiles
-                # Split M first and N second.
-                tile_m_idx = gidx % num_m_tiles
-                tile_n_idx = gidx // num_m_tiles
+                # Move across tiles
+                while tidx >= iterated_tiles and tidx < iterated_tiles + num_tiles:
+                    gidx = tidx - iterated_tiles
+                    if SMALL_M:
+                        # Too few M tiles for swizzling to matter, plain row-major
+                        tile_m_idx = gidx // num_n_tiles
+                        tile_n_idx = gidx % num_n_tiles
+                    else:
+                        # Walk tiles in super-groups of GROUP_SIZE_M tile rows so
+                        # programs running together share A rows and B columns in L2
+                        super_group_id = gidx // num_tiles_in_super_group
+                        first_tile_m_idx = super_group_id * GROUP_SIZE_M
+                        super_group_size_m = tl.minimum(
+                            num_m_tiles - first_tile_m_idx, GROUP_SIZE_M
+                        )
+                        gidx_in_super_group = gidx % num_tiles_in_super_group
+                        tile_m_idx = first_tile_m_idx + (
+                            gidx_in_super_group % super_group_size_m
+                        )
+                        tile_n_idx = gidx_in_super_group // super_group_size_m
 
-                accumulator = tl.zeros((BLOCK_SIZE_M, BLOCK_SIZE_N), dtype=tl.float32)
-                tl.static_assert(K % BLOCK_SIZE_K == 0)
+                    accumulator = tl.zeros(
+                        (BLOCK_SIZE_M, BLOCK_SIZE_N), dtype=tl.float32
+                    )
 
-                if USE_TMA_LOAD:
                     # Use TMA to load input and weight blocks with FP8 support
                     m_offset = (M_start_offset + tile_m_idx * BLOCK_SIZE_M).to(tl.int32)
                     n_offset = (N_start_offset + tile_n_idx * BLOCK_SIZE_N).to(tl.int32)
 
-                    for k_offset in range(0, K, BLOCK_SIZE_K):
+                    for k_offset in tl.range(0, K, BLOCK_SIZE_K, num_stages=NUM_STAGES):
                         # Load input block [M, K] with FP8
-                        a = tl._experimental_descriptor_load(
-                            a_desc_ptr,
-                            [m_offset, k_offset],
-                            [BLOCK_SIZE_M, BLOCK_SIZE_K],
-                            dtype,
-                        )
+                        a = a_desc.load([m_offset, k_offset])
 
                         # Load weight block [N, K] with FP8
-                        b = tl._experimental_descriptor_load(
-                            b_desc_ptr,
-                            [n_offset, k_offset],
-                            [BLOCK_SIZE_N, BLOCK_SIZE_K],
-                            dtype,
-                        )
+                        b = b_desc.load([n_offset, k_offset])
 
-                        # Compute matrix multiplication
-                        accumulator += tl.dot(a, b.T)
-                else:
-                    # Manual load without TMA for FP8
+                        # Compute matrix multiplication, the transpose of the
+                        # K-major smem tile is folded into the MMA operand layout
+                        accumulator = tl.dot(a, b.T, accumulator, out_dtype=tl.float32)
+
+                    # Load FP8 scales
                     offs_am = tile_m_idx * BLOCK_SIZE_M + tl.arange(0, BLOCK_SIZE_M)
                     offs_bn = tile_n_idx * BLOCK_SIZE_N + tl.arange(0, BLOCK_SIZE_N)
-                    offs_k = tl.arange(0, BLOCK_SIZE_K)
 
-                    a_ptrs = (
-                        a_desc_ptr
-                        + (M_start_offset + offs_am[:, None]) * K
-                        + offs_k[None, :]
+                    a_scale = tl.load(
+                        a_scale_ptr + M_start_offset + offs_am,
+                        mask=offs_am < m_size,
                     )
 
-                    b_ptrs = (
-                        b_desc_ptr
-                        + (N_start_offset + offs_bn[:, None]) * K
-                        + offs_k[None, :]
+                    b_scale = tl.load(
+                        b_scale_ptr + N_start_offset + offs_bn,
+                        mask=offs_bn < n_size,
                     )
 
-                    for k_offset in range(0, K, BLOCK_SIZE_K):
-                        # Load with bounds checking
-                        a = tl.load(a_ptrs, mask=offs_am[:, None] < m_size)
-                        b = tl.load(b_ptrs, mask=offs_bn[:, None] < n_size)
+                    # Apply scales to result, then the optional activation while
+                    # the tile is still in fp32 registers
+                    c = accumulator * a_scale[:, None] * b_scale[None, :]
+                    if ACT == 1:
+                        # GELU, exact erf form
+                        c = 0.5 * c * (1.0 + tl.erf(c * 0.7071067811865476))
+                    elif ACT == 2:
+                        # SiLU
+                        c = c * tl.sigmoid(c)
+
+                    # Store result using TMA
+                    m_offset = (tile_m_idx * BLOCK_SIZE_M).to(tl.int32)
+                    n_offset = (tile_n_idx * BLOCK_SIZE_N).to(tl.int32)
+
+                    # Downcast once after scaling, right before the store
+                    c_bf16 = c.to(tl.bfloat16)
+                    c_desc.store([m_offset, n_offset], c_bf16)
+
+                    tidx += NUM_SMS  # Move to next tile
+
+            iterated_tiles += num_tiles
+
+
+@triton.autotune(
+    configs=_AMD_CONFIGS if torch.version.hip else _NV_CONFIGS,
+    key=["G", "M_BUCKET", "N", "K"],
+    prune_configs_by={
+        # Size shared memory by the operands, which are 1 byte on the fp8 path
+        "early_config_prune": functools.partial(early_config_prune, dtype_arg="a_ptr")
+    },
+)
+@triton.heuristics(
+    {
+        # N and K divide the tiles evenly, so those bounds masks can be skipped
+        "EVEN_N": lambda args: args["N"] % args["BLOCK_SIZE_N"] == 0,
+        "EVEN_K": lambda args: args["K"] % args["BLOCK_SIZE_K"] == 0,
+        "SMALL_M": _small_m,
+    }
+)
+@triton.jit
+def _kernel_grouped_gemm_no_tma(
+    a_ptr,
+    a_scale_ptr,
+    b_ptr,
+    b_scale_ptr,
+    c_ptr,
+    m_sizes,
+    # problem sizes
+    G: tl.constexpr,
+    M_BUCKET: tl.constexpr,
+    N: tl.constexpr,  # N is per group
+    K: tl.constexpr,
+    NUM_SMS: tl.constexpr,
+    FP8_ROWWISE: tl.constexpr,
+    # tile sizes
+    BLOCK_SIZE_M: tl.constexpr,
+    BLOCK_SIZE_N: tl.constexpr,
+    BLOCK_SIZE_K: tl.constexpr,
+    NUM_STAGES: tl.constexpr,
+    EVEN_N: tl.constexpr,
+    EVEN_K: tl.constexpr,
+    SMALL_M: tl.constexpr,
+    GROUP_SIZE_M: tl.constexpr = 8,
+    ACT: tl.constexpr = 0,  # 0: none, 1: gelu, 2: silu
+) -> None:
+    # Pointer based fallback of both kernels above, for GPUs or Triton builds
+    # without TMA tensor descriptors
+    tidx = tl.program_id(0)
+
+    if FP8_ROWWISE:
+        tl.static_assert(a_ptr.dtype.element_ty.is_fp8())
+        tl.static_assert(b_ptr.dtype.element_ty.is_fp8())
 
-                        # Compute matrix multiplication
-                        accumulator += tl.dot(a, b.T)
+    M_end_offset = 0
+    iterated_tiles = 0
+    for g in tl.range(G):
+        # Move across groups
+        M_start_offset = M_end_offset
+        m_size = tl.load(m_sizes + g)
+        M_end_offset = M_start_offset + m_size
 
-                        # Update pointers for next block
-                        a_ptrs += BLOCK_SIZE_K
-                        b_ptrs += BLOCK_SIZE_K
+        if m_size > 0:
+            # Compute for this group
+            N_start_offset = g * N
+            n_size = N  # N is already per group
+
+            # Calculate the number of tiles for this group
+            num_m_tiles = tl.cdiv(m_size, BLOCK_SIZE_M)
+            num_n_tiles = tl.cdiv(n_size, BLOCK_SIZE_N)
+            num_tiles = num_m_tiles * num_n_tiles
+            num_tiles_in_super_group = GROUP_SIZE_M * num_n_tiles
+
+            # Move across tiles
+            while tidx >= iterated_tiles and tidx < iterated_tiles + num_tiles:
+                gidx = tidx - iterated_tiles
+                if SMALL_M:
+                    # Too few M tiles for swizzling to matter, plain row-major
+                    tile_m_idx = gidx // num_n_tiles
+                    tile_n_idx = gidx % num_n_tiles
+                else:
+                    # Walk tiles in super-groups of GROUP_SIZE_M tile rows so
+                    # programs running together share A rows and B columns in L2
+                    super_group_id = gidx // num_tiles_in_super_group
+                    first_tile_m_idx = super_group_id * GROUP_SIZE_M
+                    super_group_size_m = tl.minimum(
+                        num_m_tiles - first_tile_m_idx, GROUP_SIZE_M
+                    )
+                    gidx_in_super_group = gidx % num_tiles_in_super_group
+                    tile_m_idx = first_tile_m_idx + (
+                        gidx_in_super_group % super_group_size_m
+                    )
+                    tile_n_idx = gidx_in_super_group // super_group_size_m
+
+                accumulator = tl.zeros((BLOCK_SIZE_M, BLOCK_SIZE_N), dtype=tl.float32)
 
-                # Load FP8 scales
                 offs_am = tile_m_idx * BLOCK_SIZE_M + tl.arange(0, BLOCK_SIZE_M)
                 offs_bn = tile_n_idx * BLOCK_SIZE_N + tl.arange(0, BLOCK_SIZE_N)
+                offs_k = tl.arange(0, BLOCK_SIZE_K)
+
+                # Rows past the end of the group are always masked, the row mask
+                # does not depend on K so it is built once per tile
+                mask_am = offs_am[:, None] < m_size
 
-                a_scale = tl.load(
-                    a_scale_ptr + M_start_offset + offs_am[:, None],
-                    mask=offs_am[:, None] < m_size,
+                a_ptrs = (
+                    a_ptr + (M_start_offset + offs_am[:, None]) * K + offs_k[None, :]
                 )
 
-                b_scale = tl.load(
-                    b_scale_ptr + N_start_offset + offs_bn[None, :],
-                    mask=offs_bn[None, :] < n_size,
+                # Index W as a [K, N] tile so tl.dot needs no transpose
+                b_ptrs = (
+                    b_ptr + (N_start_offset + offs_bn[None, :]) * K + offs_k[:, None]
                 )
 
-                # Apply scales to result
-                c = accumulator.to(tl.float32) * a_scale * b_scale
+                for k_offset in tl.range(0, K, BLOCK_SIZE_K, num_stages=NUM_STAGES):
+                    # Only compile-time branches in here so the loads pipeline,
+                    # the K tail is zero filled so it adds nothing to the dot
+                    k_remaining = K - k_offset
+                    if EVEN_K:
+                        a = tl.load(a_ptrs, mask=mask_am, other=0.0)
+                    else:
+                        a = tl.load(
+                            a_ptrs,
+                            mask=mask_am & (offs_k[None, :] < k_remaining),
+                            other=0.0,
+                        )
+                    if EVEN_N and EVEN_K:
+                        b = tl.load(b_ptrs)
+                    else:
+                        b = tl.load(
+                            b_ptrs,
+                            mask=(offs_k[:, None] < k_remaining)
+                            & (offs_bn[None, :] < n_size),
+                            other=0.0,
+                        )
 
-                # Store result
-                if USE_TMA_STORE:
-                    # Store using TMA
-                    m_offset = (tile_m_idx * BLOCK_SIZE_M).to(tl.int32)
-                    n_offset = (tile_n_idx * BLOCK_SIZE_N).to(tl.int32)
+                    # Compute matrix multiplication
+                    accumulator = tl.dot(a, b, accumulator, out_dtype=tl.float32)
+
+                    # Update pointers for next block
+                    a_ptrs += BLOCK_SIZE_K
+                    b_ptrs += BLOCK_SIZE_K
+
+                if FP8_ROWWISE:
+                    # Load FP8 scales
+                    a_scale = tl.load(
+                        a_scale_ptr + M_start_offset + offs_am,
+                        mask=offs_am < m_size,
+                    )
 
-                    tl._experimental_descriptor_store(
-                        c_desc_ptr,
-                        c.to(c_ptr.dtype.element_ty),
-                        [m_offset, n_offset],
+                    b_scale = tl.load(
+                        b_scale_ptr + N_start_offset + offs_bn,
+                        mask=offs_bn < n_size,
                     )
+
+                    # Apply scales to result, then the optional activation while
+                    # the tile is still in fp32 registers
+                    c = accumulator * a_scale[:, None] * b_scale[None, :]
+                    if ACT == 1:
+                        # GELU, exact erf form
+                        c = 0.5 * c * (1.0 + tl.erf(c * 0.7071067811865476))
+                    elif ACT == 2:
+                        # SiLU
+                        c = c * tl.sigmoid(c)
+                else:
+                    c = accumulator
+
+                # Downcast once after scaling, right before the store
+                c_bf16 = c.to(tl.bfloat16)
+
+                # Manual store
+                c_ptrs = (
+                    c_ptr
+                    + (M_start_offset + offs_am[:, None]) * (N * G)  # Row stride is N*G
+                    + (N_start_offset + offs_bn[None, :])  # Column offset to group's N
+                )
+                if EVEN_N:
+                    tl.store(c_ptrs, c_bf16, mask=mask_am)
                 else:
-                    # Manual store
                     tl.store(
-                        c_ptr
-                        + (M_start_offset + offs_am[:, None])
-                        * (N * G)  # Row stride is N*G
-                        + (
-                            N_start_offset + offs_bn[None, :]
-                        ),  # Column offset to this group's N
-                        c,
-                        mask=offs_am[:, None] < m_size and offs_bn[None, :] < n_size,
+                        c_ptrs,
+                        c_bf16,
+                        mask=mask_am & (offs_bn[None, :] < n_size),
                     )
 
                 tidx += NUM_SMS  # Move to next tile
@@ -482,16 +636,59 @@ def _kernel_grouped_gemm_fp8_rowwise(
             iterated_tiles += num_tiles
 
 
+# Activations the fp8 rowwise kernel can fuse into its epilogue
+_FP8_ACTIVATIONS = {None: 0, "gelu": 1, "silu": 2}
+
+# Opt-in check that m_sizes covers every row of x, off by default since it
+# costs extra launches on every forward
+_CHECK_M_SIZES = bool(os.environ.get("GROUPED_GEMM_CHECK"))
+
+
+@functools.lru_cache
+def _num_sms(device_index: int) -> int:
+    return torch.cuda.get_device_properties(device_index).multi_processor_count
+
+
+@functools.lru_cache
+def _use_tma(device_index: int) -> bool:
+    # Device side tensor descriptors need Hopper or newer and a Triton build
+    # that exposes them, everything else takes the pointer based kernel
+    if not utils.HAS_TENSOR_DESC or torch.version.hip:
+        return False
+    return torch.cuda.get_device_capability(device_index)[0] >= 9
+
+
+# TMA descriptor scratch reused across launches, one per (device, stream)
+_WORKSPACE_CACHE: Dict[Tuple[int, Optional[int]], torch.Tensor] = {}
+
+
+def _alloc_tma_scratch(size: int, alignment: int, stream: Optional[int]):
+    # Launches on the same stream are ordered, so they can share one buffer that
+    # only grows, instead of allocating a new one per launch
+    key = (torch.cuda.current_device(), stream)
+    workspace = _WORKSPACE_CACHE.get(key)
+    if workspace is None or workspace.numel() < size:
+        workspace = torch.empty(size, device="cuda", dtype=torch.uint8)
+        _WORKSPACE_CACHE[key] = workspace
+    return workspace
+
+
+@functools.lru_cache
+def _install_tma_allocator() -> None:
+    # Installed on the first TMA launch only, so an allocator the caller sets
+    # afterwards is not replaced on every forward
+    triton.set_allocator(_alloc_tma_scratch)
+
+
 def _grouped_gemm(
     x: torch.Tensor,
     w: torch.Tensor,
     m_sizes: torch.Tensor,
     x_scale: Optional[torch.Tensor] = None,
     w_scale: Optional[torch.Tensor] = None,
+    activation: Optional[str] = None,
+    out: Optional[torch.Tensor] = None,
 ) -> torch.Tensor:
-    if not utils.HAS_TMA_DESC:
-        raise NotImplementedError("Grouped GEMM without TMA is not supported yet")
-
     G = m_sizes.shape[0]
 
     assert x.is_contiguous()
@@ -508,110 +705,88 @@ def _grouped_gemm(
     N = N_times_G // G
 
     assert K == w.shape[1], f"Input K ({K}) must match weight K ({w.shape[1]})"
-
-    # Create output tensor with correct shape [M, N*G]
-    y = torch.empty((M, N_times_G), device=x.device, dtype=torch.bfloat16)
-
-    NUM_SMS = torch.cuda.get_device_properties("cuda").multi_processor_count
-    USE_TMA_LOAD = True  # not torch.version.hip
-    USE_TMA_STORE = True
-
-    desc_helper = None
-    desc_x = x
-    desc_w = w
-    workspace = None
-
-    if USE_TMA_LOAD:
-        desc_helper = utils.TmaAutoTuneHelper()
-        desc_helper.init_tma_descriptor("x")
-        desc_helper.init_tma_descriptor("w")
-        desc_x = desc_helper.get_tma_descriptor_kernel_param("x")
-        desc_w = desc_helper.get_tma_descriptor_kernel_param("w")
-
-    if USE_TMA_STORE:
-        workspace = torch.empty(
-            NUM_SMS * utils.TmaAutoTuneHelper.TMA_SIZE,
+    if _CHECK_M_SIZES:
+        # Checked on device so the host never waits on the GPU
+        torch._assert_async(m_sizes.sum() == M)
+
+    # Create output tensor with correct shape [M, N*G], or write into the caller's
+    if out is None:
+        y = torch.empty(
+            (M, N_times_G),
             device=x.device,
-            dtype=torch.uint8,
+            dtype=torch.bfloat16,
+            memory_format=torch.contiguous_format,
         )
+    else:
+        assert out.shape == (M, N_times_G) and out.dtype == torch.bfloat16
+        assert out.device == x.device and out.is_contiguous()
+        y = out
 
-    # Skip autotuning - use fixed grid size
-    grid_size = (min(NUM_SMS, 4),)  # Use smaller grid for small inputs
+    NUM_SMS = _num_sms(x.device.index)
     M_BUCKET = triton.next_power_of_2(M)
 
-    try:
-
-        if USE_TMA_LOAD and desc_helper is not None:
-            # Fixed block sizes that work well for most cases
-            BLOCK_SIZE_M = 64
-            BLOCK_SIZE_N = 64
-            BLOCK_SIZE_K = 32
+    # Persistent grid: one program per SM, each striding over tiles by NUM_SMS
+    grid = (NUM_SMS,)
 
-            desc_helper.fill_2d_tma_descriptor(
-                "x",
-                x.data_ptr(),
+    fp8_rowwise = x_scale is not None and w_scale is not None
+    if fp8_rowwise:
+        assert x_scale.is_contiguous()
+        assert w_scale.is_contiguous()
+        assert x.element_size() == 1 and w.element_size() == 1, "x and w must be FP8"
+        assert activation in _FP8_ACTIVATIONS, f"Unsupported activation: {activation}"
+    else:
+        assert x_scale is None
+        assert w_scale is None
+        assert activation is None, "activation fusion requires the fp8 rowwise path"
+
+    if _use_tma(x.device.index):
+        # TMA descriptors created on device need a global memory scratch allocation
+        _install_tma_allocator()
+
+        if fp8_rowwise:
+            _kernel_grouped_gemm_fp8_rowwise[grid](
+                x,
+                x_scale,
+                w,
+                w_scale,
+                y,
+                m_sizes,
                 M,
+                G,
+                M_BUCKET,
+                N,  # N is per group
                 K,
-                BLOCK_SIZE_M,
-                BLOCK_SIZE_K,
-                x.element_size(),
+                NUM_SMS,
+                ACT=_FP8_ACTIVATIONS[activation],
             )
-
-            desc_helper.fill_2d_tma_descriptor(
-                "w",
-                w.data_ptr(),
-                N_times_G,
+        else:
+            _kernel_grouped_gemm[grid](
+                x,
+                w,
+                y,
+                m_sizes,
+                M,
+                G,
+                M_BUCKET,
+                N,  # N is per group
                 K,
-                BLOCK_SIZE_N,
-                BLOCK_SIZE_K,
-                w.element_size(),
+                NUM_SMS,
             )
-    except Exception as e:
-        print(f"Error in TMA descriptor setup: {e}")
-
-    if x_scale is not None and w_scale is not None:
-        assert x_scale.is_contiguous()
-        assert w_scale.is_contiguous()
-        # Call kernel directly without autotuning
-        _kernel_grouped_gemm_fp8_rowwise[grid_size](
-            desc_x,
+    else:
+        _kernel_grouped_gemm_no_tma[grid](
+            x,
             x_scale,
-            desc_w,
+            w,
             w_scale,
             y,
-            workspace,
             m_sizes,
             G,
             M_BUCKET,
             N,  # N is per group
             K,
             NUM_SMS,
-            USE_TMA_LOAD,
-            USE_TMA_STORE,
-            BLOCK_SIZE_M=64,  # Fixed block sizes
-            BLOCK_SIZE_N=64,
-            BLOCK_SIZE_K=32,
-        )
-    else:
-        assert x_scale is None
-        assert w_scale is None
-        # Call kernel directly without autotuning
-        _kernel_grouped_gemm[grid_size](
-            desc_x,
-            desc_w,
-            y,
-            workspace,
-            m_sizes,
-            G,
-            M_BUCKET,
-            N,  # N is per group
-            K,
-            NUM_SMS,
-            USE_TMA_LOAD,
-            USE_TMA_STORE,
-            BLOCK_SIZE_M=64,  # Fixed block sizes
-            BLOCK_SIZE_N=64,
-            BLOCK_SIZE_K=32,
+            fp8_rowwise,
+            ACT=_FP8_ACTIVATIONS[activation],
         )
 
     # Verify the output shape
@@ -624,9 +799,12 @@ def _grouped_gemm(
 
 
 def grouped_gemm_forward(
-    x: torch.Tensor, w: torch.Tensor, m_sizes: torch.Tensor
+    x: torch.Tensor,
+    w: torch.Tensor,
+    m_sizes: torch.Tensor,
+    out: Optional[torch.Tensor] = None,
 ) -> torch.Tensor:
-    return _grouped_gemm(x, w, m_sizes)
+    return _grouped_gemm(x, w, m_sizes, out=out)
 
 
 def grouped_gemm_fp8_rowwise(
@@ -635,5 +813,7 @@ def grouped_gemm_fp8_rowwise(
     m_sizes: torch.Tensor,
     x_scale: torch.Tensor,
     w_scale: torch.Tensor,
+    activation: Optional[str] = None,
+    out: Optional[torch.Tensor] = None,
 ) -> torch.Tensor:
-    return _grouped_gemm(x, w, m_sizes, x_scale, w_scale)
+    return _grouped_gemm(x, w, m_sizes, x_scale, w_scale, activation, out)
@@ -42,17 +42,26 @@ def map_dtype_to_triton(dtype: torch.dtype) -> tl.dtype:
 # check if we have the TMA version in Triton PR #4498 (https://github.com/triton-lang/triton/pull/4498).
 HAS_TMA_DESC = "nv_tma_desc_type" in dir(tl)
 
-if HAS_TMA_DESC:
+# check if we have the stable on-device TMA API (tl.make_tensor_descriptor).
+HAS_TENSOR_DESC = hasattr(tl, "make_tensor_descriptor")
+
+# the grouped GEMM forward dispatches on HAS_TENSOR_DESC, so report based on that
+if HAS_TENSOR_DESC:
+    print(
+        "TMA benchmarks will be running with on-device tensor descriptors.",
+        file=sys.stderr,
+    )
+elif HAS_TMA_DESC:
     print(
-        "TMA benchmarks will be running with experimental grid constant TMA descriptor.",
+        "Only the experimental TMA descriptor API is available, "
+        "group gemm forward will use the non-TMA kernels.",
         file=sys.stderr,
     )
 else:
     print(
-        "Missing: This group gemm code will not run without TMA descriptor support....",
+        "Missing TMA descriptor support, group gemm will use the non-TMA kernels.",
         file=sys.stderr,
     )
-    raise NotImplementedError("grouped Gemm without TMA is not supported")
 
 
 class TmaAutoTuneHelper: